@@ -4,17 +4,25 @@ This module implements the REST API endpoints for the MEP routing system,
 handling file uploads, routing requests, and result downloads.
 """
 
-import json
+import os
 import shutil
 import uuid
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
-from fastapi import FastAPI, File, HTTPException, UploadFile, BackgroundTasks
-from fastapi.responses import FileResponse, JSONResponse
+import orjson
+import redis
+import redis.asyncio as aioredis
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.responses import FileResponse, ORJSONResponse
 from pydantic import BaseModel, Field
 from fastapi.openapi.utils import get_openapi
 from fastapi.staticfiles import StaticFiles
+from shapely.geometry import Point
 
 from mep_router.core.parser import DXFReader, LayerConfig
 from mep_router.core.space_model import SpaceModeler, SpaceModelConfig
@@ -26,17 +34,28 @@ from mep_router.core.annotator import DXFAnnotator, MEPType, AnnotationConfig
 app = FastAPI(
     title="MEP Router API",
     description="API for automated MEP routing in architectural drawings",
-    version="0.1.0"
+    version="0.1.0",
+    default_response_class=ORJSONResponse
 )
 
-# Configure upload and output directories
+# Configure upload, output and geometry cache directories
 UPLOAD_DIR = Path("uploads")
 OUTPUT_DIR = Path("outputs")
+CACHE_DIR = Path("cache")
 UPLOAD_DIR.mkdir(exist_ok=True)
 OUTPUT_DIR.mkdir(exist_ok=True)
+CACHE_DIR.mkdir(exist_ok=True)
 
-# Store job status
-job_status: Dict[str, Dict] = {}
+# Buffer size for streaming uploads to disk
+COPY_BUFFER_SIZE = 1 << 20
+
+# Store job status in Redis so all API and worker processes share it
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+redis_client = aioredis.from_url(REDIS_URL)     # used by request handlers
+worker_redis = redis.Redis.from_url(REDIS_URL)  # used by routing workers
+
+# Worker processes are replaced after this many submitted jobs
+POOL_RECYCLE_JOBS = 100
 
 # Mount static directory for logo
 app.mount("/static", StaticFiles(directory="."), name="static")
@@ -52,17 +71,84 @@ class RoutingRequest(BaseModel):
     router_config: Optional[RouterConfig] = Field(None, description="Routing configuration")
     annotation_config: Optional[AnnotationConfig] = Field(None, description="Annotation configuration")
 
-def process_routing_job(job_id: str, dxf_path: Path, request: RoutingRequest) -> None:
-    """Process a routing job in the background.
+def _job_key(job_id: str) -> str:
+    """Get the Redis key holding a job's status."""
+    return f"job:{job_id}"
+
+def _encode_job(fields: Dict[str, Any]) -> Dict[str, bytes]:
+    """Encode job status fields as JSON values of a Redis hash."""
+    return {name: orjson.dumps(value) for name, value in fields.items()}
+
+def _decode_job(raw: Dict[bytes, bytes]) -> Dict[str, Any]:
+    """Decode a job status hash read from Redis."""
+    return {name.decode(): orjson.loads(value) for name, value in raw.items()}
+
+def _update_job(job_id: str, **fields: Any) -> bool:
+    """Publish job status fields from a worker process.
     
+    The fields are only written while the job record exists, so a job
+    deleted while it runs is not brought back by its worker.
+    
+    Args:
+        job_id: Unique job identifier
+        **fields: Status fields to set
+        
+    Returns:
+        True if the fields were written, False if the job was deleted
+    """
+    key = _job_key(job_id)
+    
+    def update(pipe: redis.client.Pipeline) -> bool:
+        if not pipe.exists(key):
+            return False
+        pipe.multi()
+        pipe.hset(key, mapping=_encode_job(fields))
+        return True
+        
+    return worker_redis.transaction(update, key, value_from_callable=True)
+
+def _job_outputs(job_id: str) -> Dict[str, Path]:
+    """Get the paths of the files a job writes to the output directory."""
+    return {
+        "dxf": OUTPUT_DIR / f"{job_id}_routes.dxf",
+        "summary": OUTPUT_DIR / f"{job_id}_summary.txt",
+        "archive": OUTPUT_DIR / f"{job_id}_results.zip"
+    }
+
+async def _get_job(job_id: str) -> Dict[str, Any]:
+    """Load the status of a job.
+    
+    Args:
+        job_id: Job identifier
+        
+    Returns:
+        Job status dictionary
+        
+    Raises:
+        HTTPException: If the job doesn't exist
+    """
+    raw = await redis_client.hgetall(_job_key(job_id))
+    if not raw:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _decode_job(raw)
+
+def process_routing_job(job_id: str, dxf_path: Path,
+                        config_data: Dict[str, Any]) -> None:
+    """Process a routing job in a worker process.
+        
     Args:
         job_id: Unique job identifier
         dxf_path: Path to uploaded DXF file
-        request: Routing request configuration
+        config_data: Routing request configuration as parsed JSON
     """
+    outputs = _job_outputs(job_id)
+    
     try:
-        # Update job status
-        job_status[job_id]["status"] = "processing"
+        # Update job status; jobs deleted while they were queued are skipped
+        if not _update_job(job_id, status="processing"):
+            return
+        
+        request = RoutingRequest(**config_data)
         
         # Initialize components
         reader = DXFReader(request.layer_config)
@@ -71,8 +157,9 @@ def process_routing_job(job_id: str, dxf_path: Path, request: RoutingRequest) ->
         router = MEPRouter(request.router_config)
         annotator = DXFAnnotator(request.annotation_config)
         
-        # Read and parse DXF
-        doc, geometries = reader.read_file(dxf_path)
+        # Read and parse DXF; re-uploads of a drawing reuse its cached
+        # geometries, and the drawing itself is only read for annotation
+        doc, geometries = reader.read_file(dxf_path, cache_dir=CACHE_DIR)
         wall_geometry = reader.get_wall_geometry(geometries)
         door_geometries = reader.get_door_geometry(geometries)
         equipment_geometries = reader.get_equipment_geometry(geometries)
@@ -86,7 +173,6 @@ def process_routing_job(job_id: str, dxf_path: Path, request: RoutingRequest) ->
         # Build routing graph
         G = graph_builder.build_vector_graph(
             space_polygons, connection_points, [wall_geometry] + equipment_geometries)
-        graph_builder.add_bend_penalties(G)
         
         # Prepare endpoints
         endpoints = []
@@ -101,40 +187,100 @@ def process_routing_job(job_id: str, dxf_path: Path, request: RoutingRequest) ->
         
         # Create annotated DXF
         routes = {request.mep_type: optimized_paths}
-        output_path = OUTPUT_DIR / f"{job_id}_routes.dxf"
-        annotator.create_annotated_dxf(dxf_path, routes, output_path)
+        output_path = outputs["dxf"]
+        annotator.create_annotated_dxf(dxf_path, routes, output_path, doc=doc)
         
         # Create summary
         summary = annotator.create_route_summary(routes)
-        summary_path = OUTPUT_DIR / f"{job_id}_summary.txt"
+        summary_path = outputs["summary"]
         summary_path.write_text(summary)
         
+        # Package results once for download; DXF and text are stored uncompressed
+        zip_path = outputs["archive"]
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED) as zip_file:
+            zip_file.write(output_path, output_path.name)
+            zip_file.write(summary_path, summary_path.name)
+        
         # Update job status
-        job_status[job_id].update({
-            "status": "completed",
-            "output_files": {
-                "dxf": str(output_path),
-                "summary": str(summary_path)
-            }
-        })
+        if not _update_job(job_id, status="completed", output_files={
+            name: str(path) for name, path in outputs.items()
+        }):
+            # The job was deleted while it ran, so nothing else removes them
+            for path in outputs.values():
+                path.unlink(missing_ok=True)
         
     except Exception as e:
         # Update job status with error
-        job_status[job_id].update({
-            "status": "failed",
-            "error": str(e)
-        })
+        if not _update_job(job_id, status="failed", error=str(e)):
+            for path in outputs.values():
+                path.unlink(missing_ok=True)
+
+def _check_job(job_id: str, future: Future) -> None:
+    """Mark a job as failed if its worker could not report a result.
+    
+    Args:
+        job_id: Unique job identifier
+        future: Future of the finished job
+    """
+    if future.cancelled():
+        _update_job(job_id, status="failed", error="Job cancelled before it started")
+        return
+    error = future.exception()
+    if error is not None:
+        _update_job(job_id, status="failed", error=str(error))
+
+def _submit_job(job_id: str, dxf_path: Path, config_data: Dict[str, Any]) -> None:
+    """Submit a routing job to the worker pool.
+    
+    The pool is replaced every POOL_RECYCLE_JOBS jobs so long-running
+    servers don't accumulate memory in their workers; jobs already
+    submitted to the old pool still run to completion. A pool broken by a
+    worker that died is replaced and the submit retried once.
+    
+    Args:
+        job_id: Unique job identifier
+        dxf_path: Path to uploaded DXF file
+        config_data: Routing request configuration as parsed JSON
+        
+    Raises:
+        BrokenProcessPool: If the replacement pool is broken as well
+    """
+    if app.state.pool_jobs >= POOL_RECYCLE_JOBS:
+        _replace_pool()
+        
+    try:
+        future = app.state.pool.submit(process_routing_job, job_id, dxf_path, config_data)
+    except BrokenProcessPool:
+        _replace_pool()
+        future = app.state.pool.submit(process_routing_job, job_id, dxf_path, config_data)
+    app.state.pool_jobs += 1
+    future.add_done_callback(partial(_check_job, job_id))
+
+def _replace_pool() -> None:
+    """Replace the worker pool, letting jobs already submitted finish."""
+    app.state.pool.shutdown(wait=False)
+    app.state.pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    app.state.pool_jobs = 0
+
+@app.on_event("startup")
+def start_worker_pool() -> None:
+    """Create the long-lived worker pool for routing jobs."""
+    app.state.pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    app.state.pool_jobs = 0
+
+@app.on_event("shutdown")
+def stop_worker_pool() -> None:
+    """Shut down the worker pool, dropping jobs that haven't started."""
+    app.state.pool.shutdown(wait=False, cancel_futures=True)
 
 @app.post("/upload")
 async def upload_dxf(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     config: UploadFile = File(...)
-) -> JSONResponse:
+) -> ORJSONResponse:
     """Upload a DXF file and routing configuration.
     
     Args:
-        background_tasks: FastAPI background tasks
         file: DXF file to process
         config: JSON configuration file
         
@@ -145,42 +291,50 @@ async def upload_dxf(
         # Generate job ID
         job_id = str(uuid.uuid4())
         
+        # Parse and validate configuration straight from the upload
+        config_raw = await config.read()
+        config_data = orjson.loads(config_raw)
+        RoutingRequest(**config_data)
+        
         # Save uploaded files
         dxf_path = UPLOAD_DIR / f"{job_id}.dxf"
         config_path = UPLOAD_DIR / f"{job_id}_config.json"
         
         with dxf_path.open("wb") as f:
-            shutil.copyfileobj(file.file, f)
-        with config_path.open("wb") as f:
-            shutil.copyfileobj(config.file, f)
-            
-        # Parse configuration
-        config_data = json.loads(config_path.read_text())
-        request = RoutingRequest(**config_data)
+            shutil.copyfileobj(file.file, f, length=COPY_BUFFER_SIZE)
+        config_path.write_bytes(config_raw)
         
         # Initialize job status
-        job_status[job_id] = {
+        await redis_client.hset(_job_key(job_id), mapping=_encode_job({
             "status": "queued",
             "input_files": {
                 "dxf": str(dxf_path),
                 "config": str(config_path)
             }
-        }
-        
-        # Start background processing
-        background_tasks.add_task(process_routing_job, job_id, dxf_path, request)
-        
-        return JSONResponse({
-            "job_id": job_id,
-            "status": "queued",
-            "message": "Routing job started"
-        })
+        }))
         
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+        
+    # Start processing in the worker pool
+    try:
+        _submit_job(job_id, dxf_path, config_data)
+    except Exception as e:
+        # Record the failure so the job can still be inspected and deleted
+        await redis_client.hset(_job_key(job_id), mapping=_encode_job({
+            "status": "failed",
+            "error": str(e)
+        }))
+        raise HTTPException(status_code=503, detail=f"Failed to start job: {e}")
+        
+    return ORJSONResponse({
+        "job_id": job_id,
+        "status": "queued",
+        "message": "Routing job started"
+    })
 
 @app.get("/status/{job_id}")
-async def get_job_status(job_id: str) -> JSONResponse:
+async def get_job_status(job_id: str) -> ORJSONResponse:
     """Get the status of a routing job.
     
     Args:
@@ -189,10 +343,7 @@ async def get_job_status(job_id: str) -> JSONResponse:
     Returns:
         JSON response with job status
     """
-    if job_id not in job_status:
-        raise HTTPException(status_code=404, detail="Job not found")
-        
-    return JSONResponse(job_status[job_id])
+    return ORJSONResponse(await _get_job(job_id))
 
 @app.get("/download/{job_id}")
 async def download_results(job_id: str) -> FileResponse:
@@ -204,35 +355,21 @@ async def download_results(job_id: str) -> FileResponse:
     Returns:
         ZIP file containing results
     """
-    if job_id not in job_status:
-        raise HTTPException(status_code=404, detail="Job not found")
-        
-    status = job_status[job_id]
+    status = await _get_job(job_id)
     if status["status"] != "completed":
         raise HTTPException(
             status_code=400,
             detail=f"Job not completed (status: {status['status']})"
         )
         
-    # Create ZIP file
-    zip_path = OUTPUT_DIR / f"{job_id}_results.zip"
-    with shutil.ZipFile(zip_path, "w") as zip_file:
-        # Add DXF file
-        dxf_path = Path(status["output_files"]["dxf"])
-        zip_file.write(dxf_path, dxf_path.name)
-        
-        # Add summary file
-        summary_path = Path(status["output_files"]["summary"])
-        zip_file.write(summary_path, summary_path.name)
-        
     return FileResponse(
-        zip_path,
+        status["output_files"]["archive"],
         media_type="application/zip",
         filename=f"mep_routes_{job_id}.zip"
     )
 
 @app.delete("/jobs/{job_id}")
-async def delete_job(job_id: str) -> JSONResponse:
+async def delete_job(job_id: str) -> ORJSONResponse:
     """Delete a routing job and its files.
     
     Args:
@@ -241,27 +378,21 @@ async def delete_job(job_id: str) -> JSONResponse:
     Returns:
         JSON response confirming deletion
     """
-    if job_id not in job_status:
-        raise HTTPException(status_code=404, detail="Job not found")
+    status = await _get_job(job_id)
         
     try:
+        # Remove job status first so queued jobs are skipped by workers
+        await redis_client.delete(_job_key(job_id))
+        
         # Delete input files
-        for file_path in job_status[job_id]["input_files"].values():
+        for file_path in status.get("input_files", {}).values():
             Path(file_path).unlink(missing_ok=True)
             
-        # Delete output files
-        if "output_files" in job_status[job_id]:
-            for file_path in job_status[job_id]["output_files"].values():
-                Path(file_path).unlink(missing_ok=True)
-                
-        # Delete ZIP file
-        zip_path = OUTPUT_DIR / f"{job_id}_results.zip"
-        zip_path.unlink(missing_ok=True)
-        
-        # Remove job status
-        del job_status[job_id]
-        
-        return JSONResponse({
+        # Delete output files (including the results archive)
+        for file_path in status.get("output_files", {}).values():
+            Path(file_path).unlink(missing_ok=True)
+        
+        return ORJSONResponse({
             "status": "success",
             "message": f"Job {job_id} deleted"
         })
@@ -10,9 +10,12 @@ from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
 import ezdxf
+import numpy as np
+import shapely
 from ezdxf.document import Drawing
-from ezdxf.entities import LWPolyline
-from shapely.geometry import LineString, Point
+from ezdxf.enums import TextEntityAlignment
+from ezdxf.layouts import Modelspace
+from shapely.geometry import Point
 
 class MEPType(Enum):
     """Types of MEP systems."""
@@ -45,6 +48,18 @@ class AnnotationConfig:
                 MEPType.PLUMBING: RouteStyle(color=5, layer="MEP_Plumbing")
             }
 
+def _polyline_length(xy: np.ndarray) -> float:
+    """Calculate the length of a polyline.
+    
+    Args:
+        xy: (N, 2) array of polyline vertices
+        
+    Returns:
+        Total length of the polyline
+    """
+    d = np.diff(xy, axis=0)
+    return float(np.hypot(d[:, 0], d[:, 1]).sum())
+
 class DXFAnnotator:
     """Handles the creation of annotated DXF files with MEP routes."""
     
@@ -72,127 +87,97 @@ class DXFAnnotator:
                                  'linetype': style.linetype
                              })
     
-    def _add_route(self, doc: Drawing, path: List[Point], 
-                  mep_type: MEPType) -> None:
-        """Add a route to the DXF document.
+    def _add_route(self, msp: Modelspace, xy: np.ndarray,
+                  type_name: str, layer: str) -> None:
+        """Add a route with its dimensions and labels to the modelspace.
         
         Args:
-            doc: ezdxf Drawing object
-            path: List of points forming the route
-            mep_type: Type of MEP system
+            msp: Modelspace of the DXF document
+            xy: (N, 2) array of points forming the route
+            type_name: MEP system name used for XDATA and labels
+            layer: Layer for all route entities
         """
-        if len(path) < 2:
-            return
-            
-        style = self.config.route_styles[mep_type]
-        msp = doc.modelspace()
-        
-        # Convert path to points for LWPolyline
-        points = [(point.x, point.y, 0) for point in path]
+        points = xy.tolist()
+        d = np.diff(xy, axis=0)
+        segment_lengths = np.hypot(d[:, 0], d[:, 1])
         
         # Create LWPolyline entity
-        polyline = msp.add_lwpolyline(points)
-        polyline.dxf.layer = style.layer
+        polyline = msp.add_lwpolyline(points, dxfattribs={'layer': layer})
         
         # Add route information as extended data
-        polyline.add_xdata("MEP_TYPE", [(1000, mep_type.value)])
-        polyline.add_xdata("ROUTE_INFO", [
-            (1000, f"Length: {LineString(path).length:.2f}"),
-            (1000, f"Points: {len(path)}")
+        polyline.set_xdata("MEP_TYPE", [(1000, type_name)])
+        polyline.set_xdata("ROUTE_INFO", [
+            (1000, f"Length: {segment_lengths.sum():.2f}"),
+            (1000, f"Points: {len(points)}")
         ])
-    
-    def _add_dimensions(self, doc: Drawing, path: List[Point],
-                       mep_type: MEPType) -> None:
-        """Add dimensions to the route.
-        
-        Args:
-            doc: ezdxf Drawing object
-            path: List of points forming the route
-            mep_type: Type of MEP system
-        """
-        if len(path) < 2:
-            return
-            
-        msp = doc.modelspace()
-        style = self.config.route_styles[mep_type]
         
-        # Add length dimension for each segment
-        for i in range(len(path) - 1):
-            start = path[i]
-            end = path[i+1]
-            
-            # Calculate dimension position
-            mid_x = (start.x + end.x) / 2
-            mid_y = (start.y + end.y) / 2
-            offset = 0.5  # Offset from route
-            
-            # Add aligned dimension
-            dim = msp.add_aligned_dim(
-                base=(start.x, start.y, 0),
-                p1=(end.x, end.y, 0),
-                p2=(mid_x + offset, mid_y + offset, 0),
-                dimstyle=self.config.dimension_style
-            )
-            dim.dxf.layer = style.layer
-    
-    def _add_labels(self, doc: Drawing, path: List[Point],
-                   mep_type: MEPType) -> None:
-        """Add labels to the route.
-        
-        Args:
-            doc: ezdxf Drawing object
-            path: List of points forming the route
-            mep_type: Type of MEP system
-        """
-        if len(path) < 2:
-            return
-            
-        msp = doc.modelspace()
-        style = self.config.route_styles[mep_type]
+        # Add length dimension for each non-degenerate segment
+        offset = 0.5  # Offset from route
+        dimstyle = self.config.dimension_style
+        dim_attribs = {'layer': layer}
+        for i in np.flatnonzero(segment_lengths > 0).tolist():
+            msp.add_aligned_dim(
+                p1=points[i],
+                p2=points[i + 1],
+                distance=offset,
+                dimstyle=dimstyle,
+                dxfattribs=dim_attribs
+            ).render()
         
         # Add label at start and end points
-        for i, point in enumerate([path[0], path[-1]]):
-            label = f"{mep_type.value}_{i+1}"
+        for i, point in enumerate((points[0], points[-1])):
             text = msp.add_text(
-                label,
+                f"{type_name}_{i+1}",
                 dxfattribs={
                     'height': self.config.text_height,
                     'style': self.config.text_style,
-                    'layer': style.layer
+                    'layer': layer
                 }
             )
-            text.set_pos((point.x, point.y, 0), align='CENTER')
+            text.set_placement((point[0], point[1], 0), align=TextEntityAlignment.CENTER)
     
     def create_annotated_dxf(self, 
                             template_path: Optional[Path],
                             routes: Dict[MEPType, List[List[Point]]],
-                            output_path: Path) -> None:
+                            output_path: Path,
+                            doc: Optional[Drawing] = None) -> None:
         """Create an annotated DXF file with MEP routes.
         
         Args:
             template_path: Path to template DXF file (optional)
             routes: Dictionary mapping MEP types to lists of routes
             output_path: Path to save the annotated DXF file
+            doc: Already parsed template drawing (optional). It is annotated
+                in place and takes precedence over template_path.
             
         Raises:
             ezdxf.DXFError: If there are issues with DXF file handling
         """
         try:
             # Create or load DXF document
-            if template_path and template_path.exists():
-                doc = ezdxf.readfile(str(template_path))
-            else:
-                doc = ezdxf.new('R2010')  # Use AutoCAD 2010 format
+            if doc is None:
+                if template_path and template_path.exists():
+                    doc = ezdxf.readfile(str(template_path))
+                else:
+                    doc = ezdxf.new('R2010')  # Use AutoCAD 2010 format
                 
             # Create layers
             self._create_layers(doc)
             
+            # Register application IDs used for route XDATA
+            for appid in ("MEP_TYPE", "ROUTE_INFO"):
+                if appid not in doc.appids:
+                    doc.appids.new(appid)
+            
             # Add routes and annotations
+            msp = doc.modelspace()
             for mep_type, path_list in routes.items():
+                layer = self.config.route_styles[mep_type].layer
+                type_name = mep_type.value
                 for path in path_list:
-                    self._add_route(doc, path, mep_type)
-                    self._add_dimensions(doc, path, mep_type)
-                    self._add_labels(doc, path, mep_type)
+                    if len(path) < 2:
+                        continue
+                    self._add_route(msp, shapely.get_coordinates(path), type_name, layer)
                     
             # Save the annotated file
             doc.saveas(str(output_path))
@@ -215,7 +200,7 @@ class DXFAnnotator:
             summary.append(f"{mep_type.value}:")
             total_length = 0
             for i, path in enumerate(path_list, 1):
-                length = LineString(path).length
+                length = _polyline_length(shapely.get_coordinates(path))
                 total_length += length
                 summary.append(f"  Route {i}:")
                 summary.append(f"    Length: {length:.2f}")
@@ -4,12 +4,16 @@ This module handles the creation of routing networks from space models,
 supporting both raster and vector-based approaches.
 """
 
-from dataclasses import dataclass
+import math
+from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Set, Tuple
 
 import networkx as nx
 import numpy as np
-from shapely.geometry import LineString, Point, Polygon
+import shapely
+from numba import njit
+from scipy.spatial import cKDTree
+from shapely.geometry import Point, Polygon
 from shapely.strtree import STRtree
 
 @dataclass
@@ -21,6 +25,130 @@ class GraphConfig:
     clearance_weight: float = 2.0      # weight multiplier for edges near obstacles
     min_clearance: float = 0.5         # minimum clearance from obstacles
 
+@dataclass(eq=False)
+class RoutingGraph:
+    """Integer-indexed routing graph stored as CSR arrays.
+    
+    Node ``i`` is located at ``xy[i]``; its neighbors are
+    ``indices[indptr[i]:indptr[i + 1]]`` with the matching ``weights``.
+    Each undirected edge is stored once per direction and ``edge_ids``
+    maps every CSR entry back to its undirected edge.
+    """
+    xy: np.ndarray        # (N, 2) node coordinates
+    indptr: np.ndarray    # (N + 1,) CSR row pointers
+    indices: np.ndarray   # (2E,) neighbor node indices
+    weights: np.ndarray   # (2E,) edge weights
+    edge_ids: np.ndarray  # (2E,) undirected edge index of each entry
+    _kdtree: Optional[cKDTree] = field(default=None, repr=False)
+    _networkx: Optional[nx.Graph] = field(default=None, init=False, repr=False)
+    
+    @classmethod
+    def from_edges(cls, xy: np.ndarray, pairs: np.ndarray,
+                   weights: np.ndarray,
+                   kdtree: Optional[cKDTree] = None) -> "RoutingGraph":
+        """Build a routing graph from an undirected edge list.
+        
+        Args:
+            xy: (N, 2) array of node coordinates
+            pairs: (E, 2) array of node index pairs
+            weights: (E,) array of edge weights
+            kdtree: KD-tree over xy to reuse for nearest-node queries
+            
+        Returns:
+            RoutingGraph with both directions of every edge
+        """
+        num_nodes = len(xy)
+        num_edges = len(pairs)
+        rows = np.concatenate([pairs[:, 0], pairs[:, 1]])
+        cols = np.concatenate([pairs[:, 1], pairs[:, 0]])
+        edge_ids = np.tile(np.arange(num_edges), 2)
+        
+        # Group entries by source node
+        order = np.argsort(rows, kind='stable')
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=num_nodes), out=indptr[1:])
+        
+        return cls(xy=np.asarray(xy, dtype=np.float64),
+                   indptr=indptr,
+                   indices=cols[order].astype(np.int64),
+                   weights=np.tile(np.asarray(weights, dtype=np.float64), 2)[order],
+                   edge_ids=edge_ids[order],
+                   _kdtree=kdtree)
+    
+    @property
+    def num_nodes(self) -> int:
+        """Number of nodes in the graph."""
+        return len(self.xy)
+    
+    @property
+    def num_edges(self) -> int:
+        """Number of undirected edges in the graph."""
+        return len(self.indices) // 2
+    
+    @property
+    def kdtree(self) -> cKDTree:
+        """KD-tree over node coordinates, built on first use."""
+        if self._kdtree is None:
+            self._kdtree = cKDTree(self.xy)
+        return self._kdtree
+    
+    def to_networkx(self) -> nx.Graph:
+        """Return a NetworkX view of the graph with integer nodes.
+        
+        The view is built on first use and cached; later changes to the
+        CSR arrays are not reflected in it.
+        
+        Returns:
+            NetworkX graph with ``pos`` node and ``weight`` edge attributes
+        """
+        if self._networkx is None:
+            G = nx.Graph()
+            G.add_nodes_from((i, {'pos': (x, y)}) for i, (x, y) in enumerate(self.xy.tolist()))
+            rows = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+            mask = rows < self.indices
+            G.add_weighted_edges_from(zip(rows[mask].tolist(),
+                                          self.indices[mask].tolist(),
+                                          self.weights[mask].tolist()))
+            self._networkx = G
+        return self._networkx
+
+# Cosine of the 45 degree angle below which bends are penalized
+COS_THRESH = math.sqrt(2) / 2
+
+@njit(cache=True)
+def _bend_penalty_factors(xy: np.ndarray, indptr: np.ndarray,
+                          indices: np.ndarray, penalty: float) -> np.ndarray:
+    """Compute bend penalty multipliers for each entry of a CSR adjacency.
+    
+    Args:
+        xy: (N, 2) array of node coordinates
+        indptr: CSR row pointer array
+        indices: CSR column index array
+        penalty: Multiplier applied per sharp angle an edge takes part in
+        
+    Returns:
+        Array of multipliers aligned with indices
+    """
+    factors = np.ones(len(indices))
+    for u in range(len(indptr) - 1):
+        for i in range(indptr[u], indptr[u + 1]):
+            dx1 = xy[indices[i], 0] - xy[u, 0]
+            dy1 = xy[indices[i], 1] - xy[u, 1]
+            len1_sq = dx1 * dx1 + dy1 * dy1
+            for j in range(i + 1, indptr[u + 1]):
+                dx2 = xy[indices[j], 0] - xy[u, 0]
+                dy2 = xy[indices[j], 1] - xy[u, 1]
+                norm_sq = len1_sq * (dx2 * dx2 + dy2 * dy2)
+                if norm_sq == 0.0:
+                    continue
+                cos_angle = (dx1 * dx2 + dy1 * dy2) / math.sqrt(norm_sq)
+                
+                # Apply penalty for sharp angles
+                if cos_angle > COS_THRESH:  # Less than 45 degrees
+                    factors[i] *= penalty
+                    factors[j] *= penalty
+    return factors
+
 class GraphBuilder:
     """Builds routing networks from space models."""
     
@@ -33,7 +161,7 @@ class GraphBuilder:
         self.config = config or GraphConfig()
         
     def _create_grid_nodes(self, binary_grid: np.ndarray, 
-                          transform: Tuple[float, float, float, float]) -> List[Point]:
+                          transform: Tuple[float, float, float, float]) -> np.ndarray:
         """Create nodes from a binary occupancy grid.
         
         Args:
@@ -41,29 +169,25 @@ class GraphBuilder:
             transform: Tuple of (minx, miny, maxx, maxy) for coordinate conversion
             
         Returns:
-            List of node points in world coordinates
+            (N, 2) array of node coordinates in world coordinates
         """
         minx, miny, maxx, maxy = transform
         height, width = binary_grid.shape
-        nodes = []
         
-        # Convert image coordinates to world coordinates
-        def image_to_world(img_x: int, img_y: int) -> Tuple[float, float]:
-            world_x = minx + (img_x / width) * (maxx - minx)
-            world_y = maxy - (img_y / height) * (maxy - miny)  # Flip Y axis
-            return world_x, world_y
+        # Pixel step between nodes (at least one pixel)
+        step = max(1, int(self.config.node_spacing * width / (maxx - minx)))
         
         # Create nodes at free spaces
-        for y in range(0, height, int(self.config.node_spacing * width / (maxx - minx))):
-            for x in range(0, width, int(self.config.node_spacing * width / (maxx - minx))):
-                if binary_grid[y, x] == 0:  # Free space
-                    world_x, world_y = image_to_world(x, y)
-                    nodes.append(Point(world_x, world_y))
-                    
-        return nodes
+        ys, xs = np.nonzero(binary_grid[::step, ::step] == 0)
+        
+        # Convert image coordinates to world coordinates
+        world_x = minx + (xs * step / width) * (maxx - minx)
+        world_y = maxy - (ys * step / height) * (maxy - miny)  # Flip Y axis
+        
+        return np.column_stack([world_x, world_y]).astype(np.float64)
     
     def _create_vector_nodes(self, space_polygons: List[Polygon],
-                           connection_points: List[Point]) -> List[Point]:
+                           connection_points: List[Point]) -> np.ndarray:
         """Create nodes from vector space model.
         
         Args:
@@ -71,69 +195,110 @@ class GraphBuilder:
             connection_points: List of connection points (e.g., near doors)
             
         Returns:
-            List of node points
+            (N, 2) array of node coordinates
         """
-        nodes = []
-        
         # Add connection points
-        nodes.extend(connection_points)
+        nodes = [shapely.get_coordinates(connection_points)]
         
         # Add grid points within each space polygon
         for space in space_polygons:
             minx, miny, maxx, maxy = space.bounds
-            x_coords = np.arange(minx, maxx, self.config.node_spacing)
-            y_coords = np.arange(miny, maxy, self.config.node_spacing)
-            
-            for x in x_coords:
-                for y in y_coords:
-                    point = Point(x, y)
-                    if space.contains(point):
-                        nodes.append(point)
+            xs, ys = np.meshgrid(np.arange(minx, maxx, self.config.node_spacing),
+                                 np.arange(miny, maxy, self.config.node_spacing),
+                                 indexing='ij')
+            xs, ys = xs.ravel(), ys.ravel()
+            inside = shapely.contains_xy(space, xs, ys)
+            nodes.append(np.column_stack([xs[inside], ys[inside]]))
                         
-        return nodes
+        return np.vstack(nodes)
     
-    def _create_edges(self, nodes: List[Point], 
-                     obstacles: List[Polygon]) -> List[Tuple[Point, Point, float]]:
+    def _create_edges(self, xy: np.ndarray, tree: cKDTree,
+                     obstacles: List[Polygon]) -> Tuple[np.ndarray, np.ndarray]:
         """Create edges between nodes that don't intersect obstacles.
         
+        Candidate pairs come from a KD-tree radius query, and all candidate
+        lines are tested against the obstacles in batched Shapely calls.
+        
         Args:
-            nodes: List of node points
+            xy: (N, 2) array of node coordinates
+            tree: KD-tree over xy
             obstacles: List of obstacle polygons
             
         Returns:
-            List of (node1, node2, weight) tuples
+            Tuple of (pairs, weights) where pairs is an (M, 2) array of node
+            indices and weights is an (M,) array of edge weights
         """
-        edges = []
-        strtree = STRtree(obstacles)
-        
-        # Create edges between nodes that are close enough
-        for i, node1 in enumerate(nodes):
-            for node2 in nodes[i+1:]:
-                # Skip if nodes are too far apart
-                if node1.distance(node2) > self.config.max_edge_length:
-                    continue
-                    
-                # Create line between nodes
-                line = LineString([node1, node2])
-                
-                # Check for intersections with obstacles
-                if not any(line.intersects(obs) for obs in strtree.query(line)):
-                    # Calculate edge weight based on length and clearance
-                    weight = node1.distance(node2)
-                    
-                    # Add clearance penalty
-                    min_clearance = min(line.distance(obs) for obs in strtree.query(line))
-                    if min_clearance < self.config.min_clearance:
-                        weight *= self.config.clearance_weight
-                        
-                    edges.append((node1, node2, weight))
-                    
-        return edges
+        # Only pairs within max_edge_length are considered
+        pairs = tree.query_pairs(self.config.max_edge_length, output_type='ndarray')
+        if len(pairs) == 0 or not obstacles:
+            diffs = xy[pairs[:, 1]] - xy[pairs[:, 0]]
+            return pairs, np.hypot(diffs[:, 0], diffs[:, 1])
+            
+        # Build all candidate lines at once
+        coords = xy[pairs]
+        lines = shapely.linestrings(coords)
+        
+        # Prepare obstacles once so every intersects test uses the GEOS index
+        obstacle_arr = np.asarray(obstacles, dtype=object)
+        shapely.prepare(obstacle_arr)
+        
+        # Drop lines that intersect any obstacle: bounding box candidates
+        # from one tree query, then exact tests against prepared obstacles
+        strtree = STRtree(obstacle_arr)
+        line_idx, obstacle_idx = strtree.query(lines)
+        hits = shapely.intersects(obstacle_arr[obstacle_idx], lines[line_idx])
+        blocked = np.zeros(len(lines), dtype=bool)
+        blocked[line_idx[hits]] = True
+        pairs, coords, lines = pairs[~blocked], coords[~blocked], lines[~blocked]
+        
+        # Calculate edge weight based on length
+        diffs = coords[:, 1] - coords[:, 0]
+        weights = np.hypot(diffs[:, 0], diffs[:, 1])
+        
+        # Add clearance penalty; the nearest-obstacle search is bounded by
+        # min_clearance so only lines close to an obstacle are returned
+        if self.config.min_clearance > 0:
+            (line_idx, _), distances = strtree.query_nearest(
+                lines, max_distance=self.config.min_clearance,
+                return_distance=True, all_matches=False)
+            near = np.zeros(len(lines), dtype=bool)
+            near[line_idx[distances < self.config.min_clearance]] = True
+            weights = np.where(near, weights * self.config.clearance_weight, weights)
+        
+        return pairs, weights
+    
+    def _build_graph(self, xy: np.ndarray,
+                     obstacles: List[Polygon]) -> RoutingGraph:
+        """Connect node coordinates into a routing graph.
+        
+        Args:
+            xy: (N, 2) array of node coordinates
+            obstacles: List of obstacle polygons for clearance checking
+            
+        Returns:
+            RoutingGraph for routing, with bend penalties applied
+        """
+        tree = cKDTree(xy)
+        pairs, weights = self._create_edges(xy, tree, obstacles)
+        G = RoutingGraph.from_edges(xy, pairs, weights, kdtree=tree)
+        if G.num_edges == 0:
+            return G
+            
+        # Add penalties for edges that create sharp bends; only edges that
+        # survived the obstacle filter are in the CSR arrays
+        factors = _bend_penalty_factors(G.xy, G.indptr, G.indices,
+                                        self.config.bend_penalty)
+        
+        # Penalties from either endpoint compound on the shared edge
+        edge_factors = np.ones(G.num_edges)
+        np.multiply.at(edge_factors, G.edge_ids, factors)
+        G.weights *= edge_factors[G.edge_ids]
+        return G
     
     def build_raster_graph(self, 
                           binary_grid: np.ndarray,
                           transform: Tuple[float, float, float, float],
-                          obstacles: List[Polygon]) -> nx.Graph:
+                          obstacles: List[Polygon]) -> RoutingGraph:
         """Build a routing graph from a raster space model.
         
         Args:
@@ -142,27 +307,15 @@ class GraphBuilder:
             obstacles: List of obstacle polygons for clearance checking
             
         Returns:
-            NetworkX graph for routing
+            RoutingGraph for routing
         """
-        # Create nodes
-        nodes = self._create_grid_nodes(binary_grid, transform)
-        
-        # Create edges
-        edges = self._create_edges(nodes, obstacles)
-        
-        # Build graph
-        G = nx.Graph()
-        for node in nodes:
-            G.add_node(node, pos=(node.x, node.y))
-        for node1, node2, weight in edges:
-            G.add_edge(node1, node2, weight=weight)
-            
-        return G
+        xy = self._create_grid_nodes(binary_grid, transform)
+        return self._build_graph(xy, obstacles)
     
     def build_vector_graph(self,
                           space_polygons: List[Polygon],
                           connection_points: List[Point],
-                          obstacles: List[Polygon]) -> nx.Graph:
+                          obstacles: List[Polygon]) -> RoutingGraph:
         """Build a routing graph from a vector space model.
         
         Args:
@@ -171,41 +324,7 @@ class GraphBuilder:
             obstacles: List of obstacle polygons for clearance checking
             
         Returns:
-            NetworkX graph for routing
+            RoutingGraph for routing
         """
-        # Create nodes
-        nodes = self._create_vector_nodes(space_polygons, connection_points)
-        
-        # Create edges
-        edges = self._create_edges(nodes, obstacles)
-        
-        # Build graph
-        G = nx.Graph()
-        for node in nodes:
-            G.add_node(node, pos=(node.x, node.y))
-        for node1, node2, weight in edges:
-            G.add_edge(node1, node2, weight=weight)
-            
-        return G
-    
-    def add_bend_penalties(self, G: nx.Graph) -> None:
-        """Add penalties for edges that create sharp bends.
-        
-        Args:
-            G: NetworkX graph to modify
-        """
-        for node in G.nodes():
-            neighbors = list(G.neighbors(node))
-            if len(neighbors) >= 2:
-                for i, n1 in enumerate(neighbors):
-                    for n2 in neighbors[i+1:]:
-                        # Calculate angle between edges
-                        v1 = np.array([n1.x - node.x, n1.y - node.y])
-                        v2 = np.array([n2.x - node.x, n2.y - node.y])
-                        angle = np.arccos(np.dot(v1, v2) / 
-                                        (np.linalg.norm(v1) * np.linalg.norm(v2)))
-                        
-                        # Apply penalty for sharp angles
-                        if angle < np.pi / 4:  # Less than 45 degrees
-                            G[node][n1]['weight'] *= self.config.bend_penalty
-                            G[node][n2]['weight'] *= self.config.bend_penalty 
\ No newline at end of file
+        xy = self._create_vector_nodes(space_polygons, connection_points)
+        return self._build_graph(xy, obstacles)
@@ -4,16 +4,29 @@ This module handles the ingestion of DXF files and conversion of DXF entities
 to Shapely geometries for spatial analysis.
 """
 
+import hashlib
+import os
+import zipfile
+from collections import defaultdict
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Optional, Set, Tuple
 
 import ezdxf
+import numpy as np
+import shapely
 from ezdxf.document import Drawing
 from ezdxf.entities import DXFEntity, Line, LWPolyline
 from shapely.geometry import LineString, Point, Polygon
+from shapely.errors import GEOSException
 from shapely.ops import unary_union
 
+# Suffix of the geometry cache files written by DXFReader.read_file
+GEOMETRY_CACHE_SUFFIX = ".npz"
+
+# Chunk size for hashing DXF files
+HASH_BUFFER_SIZE = 1 << 20
+
 @dataclass
 class LayerConfig:
     """Configuration for DXF layer processing."""
@@ -33,6 +46,17 @@ class DXFGeometryConverter:
         """
         self.layer_config = layer_config or LayerConfig()
         
+        # Converters by DXF entity type
+        self._converters = {
+            "LINE": self._convert_line,
+            "LWPOLYLINE": self._convert_lwpolyline,
+        }
+        
+    @property
+    def supported_types(self) -> Tuple[str, ...]:
+        """DXF entity types that can be converted to Shapely geometries."""
+        return tuple(self._converters)
+        
     def _convert_line(self, entity: Line) -> LineString:
         """Convert an ezdxf Line to a Shapely LineString."""
         return LineString([(entity.dxf.start.x, entity.dxf.start.y),
@@ -40,18 +64,15 @@ class DXFGeometryConverter:
     
     def _convert_lwpolyline(self, entity: LWPolyline) -> LineString:
         """Convert an ezdxf LWPolyline to a Shapely LineString or Polygon."""
-        points = [(point[0], point[1]) for point in entity.get_points()]
+        points = np.asarray(entity.get_points('xy'), dtype=np.float64).reshape(-1, 2)
         if entity.closed:
             return Polygon(points)
         return LineString(points)
     
     def _convert_entity(self, entity: DXFEntity) -> Optional[LineString | Polygon]:
         """Convert a DXF entity to a Shapely geometry based on its type."""
-        if isinstance(entity, Line):
-            return self._convert_line(entity)
-        elif isinstance(entity, LWPolyline):
-            return self._convert_lwpolyline(entity)
-        return None
+        convert = self._converters.get(entity.dxftype())
+        return convert(entity) if convert is not None else None
 
 class DXFReader:
     """Handles DXF file reading and initial processing."""
@@ -65,38 +86,140 @@ class DXFReader:
         self.layer_config = layer_config or LayerConfig()
         self.converter = DXFGeometryConverter(layer_config)
         
-    def read_file(self, file_path: Path) -> Tuple[Drawing, Dict[str, List[LineString | Polygon]]]:
+    def _entity_query(self) -> str:
+        """Build the ezdxf query selecting convertible, non-ignored entities.
+        
+        Returns:
+            Entity query string, e.g. 'LINE LWPOLYLINE[layer!="0"]'
+        """
+        query = " ".join(self.converter.supported_types)
+        if self.layer_config.ignore_layers:
+            query += "[" + " & ".join(f'layer!="{layer}"'
+                                      for layer in sorted(self.layer_config.ignore_layers)) + "]"
+        return query
+        
+    def _cache_path(self, file_path: Path, cache_dir: Path) -> Path:
+        """Get the geometry cache file for the contents of a DXF file.
+        
+        The name is a hash of the file contents and the entity query, so
+        copies of one drawing share a cache file and edited drawings or
+        changed layer settings get a new one.
+        
+        Args:
+            file_path: Path to the DXF file
+            cache_dir: Directory holding geometry cache files
+            
+        Returns:
+            Path of the cache file, which may not exist yet
+        """
+        digest = hashlib.sha256(self._entity_query().encode())
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_BUFFER_SIZE), b""):
+                digest.update(chunk)
+        return Path(cache_dir) / f"{digest.hexdigest()}{GEOMETRY_CACHE_SUFFIX}"
+        
+    @staticmethod
+    def _load_geometries(cache_path: Path) -> Optional[Dict[str, List[LineString | Polygon]]]:
+        """Load cached layer geometries.
+        
+        Only plain arrays are read, never pickled objects.
+        
+        Args:
+            cache_path: Path of the cache file
+            
+        Returns:
+            Dictionary mapping layer names to lists of Shapely geometries,
+            or None if the cache file is missing or unreadable
+        """
+        try:
+            with np.load(cache_path, allow_pickle=False) as data:
+                layers = data["layers"].tolist()
+                counts, sizes, wkb = data["counts"], data["sizes"], data["wkb"].tobytes()
+            if not layers:
+                return {}
+                
+            # Split the concatenated WKB back into one blob per geometry
+            ends = np.cumsum(sizes).tolist()
+            blobs = np.array([wkb[end - size:end] for end, size in zip(ends, sizes.tolist())],
+                             dtype=object)
+            geometries = shapely.from_wkb(blobs)
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile, GEOSException):
+            return None
+        return {layer: list(layer_geometries) for layer, layer_geometries
+                in zip(layers, np.split(geometries, np.cumsum(counts)[:-1]))}
+        
+    @staticmethod
+    def _save_geometries(cache_path: Path,
+                         geometries: Dict[str, List[LineString | Polygon]]) -> None:
+        """Write layer geometries to a cache file as WKB.
+        
+        The file is written under a temporary name and then renamed, so
+        concurrent readers never see a partial file. Reading still works if
+        the cache can't be written.
+        
+        Args:
+            cache_path: Path of the cache file
+            geometries: Dictionary mapping layer names to lists of Shapely geometries
+        """
+        layers = list(geometries)
+        wkb = shapely.to_wkb(np.array([geometry for layer in layers
+                                       for geometry in geometries[layer]], dtype=object))
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        try:
+            with tmp_path.open("wb") as f:
+                np.savez(f,
+                         layers=np.array(layers, dtype=str),
+                         counts=np.array([len(geometries[layer]) for layer in layers],
+                                         dtype=np.int64),
+                         sizes=np.array([len(blob) for blob in wkb], dtype=np.int64),
+                         wkb=np.frombuffer(b"".join(wkb), dtype=np.uint8))
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            tmp_path.unlink(missing_ok=True)
+            
+    def read_file(self, file_path: Path, cache_dir: Optional[Path] = None
+                  ) -> Tuple[Optional[Drawing], Dict[str, List[LineString | Polygon]]]:
         """Read a DXF file and convert its entities to Shapely geometries.
         
+        With a cache directory, the geometries of every parsed file are
+        stored there as WKB and reused for files with the same contents,
+        which skips DXF parsing entirely.
+        
         Args:
             file_path: Path to the DXF file.
+            cache_dir: Directory for geometry cache files (optional).
             
         Returns:
             Tuple containing:
-            - The ezdxf Drawing object
+            - The ezdxf Drawing object, or None if the geometries were
+              loaded from the cache
             - Dictionary mapping layer names to lists of Shapely geometries
             
         Raises:
             ezdxf.DXFError: If the DXF file is invalid or cannot be read.
         """
+        if cache_dir is not None:
+            cache_path = self._cache_path(file_path, cache_dir)
+            geometries = self._load_geometries(cache_path)
+            if geometries is not None:
+                return None, geometries
+                
         try:
             doc = ezdxf.readfile(str(file_path))
         except ezdxf.DXFError as e:
             raise ezdxf.DXFError(f"Failed to read DXF file: {e}")
             
-        geometries: Dict[str, List[LineString | Polygon]] = {}
+        geometries: Dict[str, List[LineString | Polygon]] = defaultdict(list)
+        convert = self.converter._convert_entity
         
-        for entity in doc.modelspace():
-            if entity.dxf.layer in self.layer_config.ignore_layers:
-                continue
-                
-            geometry = self.converter._convert_entity(entity)
+        for entity in doc.modelspace().query(self._entity_query()):
+            geometry = convert(entity)
             if geometry is not None:
-                layer = entity.dxf.layer
-                if layer not in geometries:
-                    geometries[layer] = []
-                geometries[layer].append(geometry)
+                geometries[entity.dxf.layer].append(geometry)
                 
+        geometries = dict(geometries)
+        if cache_dir is not None:
+            self._save_geometries(cache_path, geometries)
         return doc, geometries
     
     def get_wall_geometry(self, geometries: Dict[str, List[LineString | Polygon]]) -> Polygon:
@@ -4,13 +4,21 @@ This module implements a modified A* pathfinding algorithm tailored for MEP syst
 incorporating bend penalties and clearance requirements.
 """
 
-from dataclasses import dataclass
+import heapq
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
 from typing import Dict, List, Optional, Set, Tuple
 
-import networkx as nx
 import numpy as np
+import shapely
+from numba import njit
 from shapely.geometry import LineString, Point, Polygon
 from shapely.ops import unary_union
+from shapely.strtree import STRtree
+
+from mep_router.core.graph import RoutingGraph
 
 @dataclass
 class RouterConfig:
@@ -21,6 +29,102 @@ class RouterConfig:
     bend_penalty: float = 1.5       # penalty multiplier for bends
     clearance_penalty: float = 2.0   # penalty multiplier for tight spaces
     smoothing_factor: float = 0.1   # factor for path smoothing (0-1)
+    num_workers: int = 1            # worker processes for multiple paths
+
+@njit(cache=True)
+def _astar_csr(indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray,
+               heuristic: np.ndarray, source: int, target: int) -> np.ndarray:
+    """Find a shortest path on CSR graph arrays using A*.
+    
+    Expansion order and tie-breaking follow networkx.astar_path. With an
+    all-zero heuristic this is Dijkstra's algorithm.
+    
+    Args:
+        indptr: CSR row pointer array
+        indices: CSR column index array
+        weights: Edge weights aligned with indices
+        heuristic: Estimated cost from every node to the target
+        source: Source node index
+        target: Target node index
+        
+    Returns:
+        Array of node indices from source to target, empty if no path exists
+    """
+    explored = np.full(len(indptr) - 1, -2, dtype=np.int64)  # parents, -1 = source
+    enqueued = np.full(len(indptr) - 1, np.inf)              # best queued cost
+    counter = 0
+    queue = [(0.0, counter, np.int64(source), 0.0, np.int64(-1))]
+    
+    while len(queue) > 0:
+        _, _, node, dist, parent = heapq.heappop(queue)
+        
+        if node == target:
+            path = [node]
+            while parent != -1:
+                path.append(parent)
+                parent = explored[parent]
+            path.reverse()
+            return np.array(path, dtype=np.int64)
+            
+        if explored[node] != -2:
+            # Source node or already expanded with a shorter distance
+            if explored[node] == -1 or enqueued[node] < dist:
+                continue
+        explored[node] = parent
+        
+        for k in range(indptr[node], indptr[node + 1]):
+            neighbor = indices[k]
+            cost = dist + weights[k]
+            if enqueued[neighbor] <= cost:
+                continue
+            enqueued[neighbor] = cost
+            counter += 1
+            heapq.heappush(queue, (cost + heuristic[neighbor], counter,
+                                   neighbor, cost, node))
+            
+    return np.empty(0, dtype=np.int64)
+
+@njit(cache=True)
+def _count_bends_kernel(path: np.ndarray) -> int:
+    """Count vertices where consecutive segments meet at less than 135 degrees.
+    
+    Args:
+        path: (N, 2) array of path coordinates
+        
+    Returns:
+        Number of bends; vertices next to zero-length segments are skipped
+    """
+    bends = 0
+    for i in range(1, len(path) - 1):
+        dx1 = path[i, 0] - path[i - 1, 0]
+        dy1 = path[i, 1] - path[i - 1, 1]
+        dx2 = path[i + 1, 0] - path[i, 0]
+        dy2 = path[i + 1, 1] - path[i, 1]
+        norm = math.hypot(dx1, dy1) * math.hypot(dx2, dy2)
+        if norm == 0.0:
+            continue
+        cos_angle = min(1.0, max(-1.0, (dx1 * dx2 + dy1 * dy2) / norm))
+        if math.acos(cos_angle) < math.pi * 0.75:  # Less than 135 degrees
+            bends += 1
+    return bends
+
+@njit(cache=True)
+def _smooth_path_kernel(path: np.ndarray, factor: float) -> np.ndarray:
+    """Move interior points towards the average of their neighbors.
+    
+    Args:
+        path: (N, 2) array of path coordinates
+        factor: Interpolation factor between original and averaged points
+        
+    Returns:
+        Smoothed (N, 2) array; start and end points are kept
+    """
+    smoothed = path.copy()
+    for i in range(1, len(path) - 1):
+        for k in range(2):
+            average = (path[i - 1, k] + path[i, k] + path[i + 1, k]) / 3
+            smoothed[i, k] = path[i, k] + (average - path[i, k]) * factor
+    return smoothed
 
 class MEPRouter:
     """Implements modified A* routing for MEP systems."""
@@ -33,132 +137,220 @@ class MEPRouter:
         """
         self.config = config or RouterConfig()
         
-    def _heuristic(self, node1: Point, node2: Point, 
-                  obstacles: List[Polygon]) -> float:
-        """Calculate heuristic cost between two nodes.
+        # Per-graph state, reset whenever a different graph, obstacle
+        # list or configuration is routed with
+        self._graph: Optional[RoutingGraph] = None
+        self._bound_config: Optional[RouterConfig] = None
+        self._obstacles: Optional[List[Polygon]] = None
+        self._obstacle_arr: Optional[np.ndarray] = None
+        self._obstacle_tree: Optional[STRtree] = None
+        self._clearance_tree: Optional[STRtree] = None
+        self._clearance_radius: Optional[float] = None
+        self._clearance_bounds: Optional[np.ndarray] = None
+        self._path_cache: Dict[Tuple[int, int], Optional[List[int]]] = {}
+        self._heuristic_cache: Dict[int, np.ndarray] = {}
+        self._result_cache: Dict[Tuple[float, float, float, float], Optional[List[Point]]] = {}
+        
+    def _prepare(self, G: RoutingGraph, obstacles: List[Polygon]) -> None:
+        """Bind the router to a graph, obstacle list and configuration.
+        
+        Cached results are kept while the same graph and obstacle list
+        objects are passed in with an unchanged configuration, and cleared
+        as soon as any of them changes.
         
         Args:
-            node1: Start node
-            node2: End node
+            G: Routing graph
             obstacles: List of obstacle polygons
+        """
+        if (G is self._graph and obstacles is self._obstacles and
+                self.config == self._bound_config):
+            return
+        self._graph = G
+        self._bound_config = replace(self.config)
+        self._obstacles = obstacles
+        self._obstacle_arr = np.asarray(obstacles, dtype=object)
+        self._obstacle_tree = None
+        self._clearance_tree = None
+        self._clearance_radius = None
+        self._path_cache.clear()
+        self._heuristic_cache.clear()
+        self._result_cache.clear()
+        
+    def _clearance_zones(self) -> STRtree:
+        """Get the bound obstacles grown by min_bend_radius.
+        
+        The buffers are built on first use and rebuilt only when the
+        obstacles or min_bend_radius change.
+        
+        Returns:
+            STRtree over the prepared buffered obstacles
+        """
+        radius = self.config.min_bend_radius
+        if self._clearance_tree is None or self._clearance_radius != radius:
+            # The polygonal buffer is inscribed in the true offset curve, so
+            # grow it until it circumscribes it; distances stay exact
+            quad_segs = 8
+            zones = shapely.buffer(self._obstacle_arr,
+                                   radius / math.cos(math.pi / (4 * quad_segs)),
+                                   quad_segs=quad_segs)
+            shapely.prepare(zones)
+            self._clearance_tree = STRtree(zones)
+            self._clearance_radius = radius
+            self._clearance_bounds = shapely.total_bounds(zones)
+        return self._clearance_tree
+        
+    def _crosses_obstacles(self, segments: np.ndarray) -> np.ndarray:
+        """Find segments intersecting any bound obstacle.
+        
+        Args:
+            segments: (M, 2, 2) array of segment end point coordinates
             
         Returns:
-            Estimated cost between nodes
+            Boolean array, True where a segment touches an obstacle
         """
-        # Base cost is Euclidean distance
-        base_cost = node1.distance(node2)
+        crosses = np.zeros(len(segments), dtype=bool)
+        if not self._obstacles:
+            return crosses
+        if self._obstacle_tree is None:
+            self._obstacle_tree = STRtree(self._obstacle_arr)
+        line_idx, _ = self._obstacle_tree.query(shapely.linestrings(segments),
+                                                predicate='intersects')
+        crosses[line_idx] = True
+        return crosses
         
-        # Add clearance penalty
-        line = LineString([node1, node2])
-        min_clearance = min(line.distance(obs) for obs in obstacles)
-        if min_clearance < self.config.min_bend_radius:
-            base_cost *= self.config.clearance_penalty
+    def _near_obstacles(self, segments: np.ndarray) -> np.ndarray:
+        """Find segments closer than min_bend_radius to any bound obstacle.
+        
+        Args:
+            segments: (M, 2, 2) array of segment end point coordinates
             
-        return base_cost
+        Returns:
+            Boolean array, True where clearance is violated
+        """
+        near = np.zeros(len(segments), dtype=bool)
+        if not self._obstacles or self.config.min_bend_radius <= 0:
+            return near
+        tree = self._clearance_zones()
+        
+        # Only segments overlapping the extent of the buffered obstacles
+        # need a geometry
+        minx, miny, maxx, maxy = self._clearance_bounds
+        lower, upper = segments.min(axis=1), segments.max(axis=1)
+        candidates = np.flatnonzero((upper[:, 0] >= minx) & (lower[:, 0] <= maxx) &
+                                    (upper[:, 1] >= miny) & (lower[:, 1] <= maxy))
+        lines = shapely.linestrings(segments[candidates])
+        
+        # Bounding box candidates, then intersects tests on the prepared
+        # buffers; only those hits need an exact distance
+        line_idx, zone_idx = tree.query(lines)
+        hits = shapely.intersects(tree.geometries[zone_idx], lines[line_idx])
+        line_idx, zone_idx = line_idx[hits], zone_idx[hits]
+        distances = shapely.distance(self._obstacle_arr[zone_idx], lines[line_idx])
+        near[candidates[line_idx[distances < self.config.min_bend_radius]]] = True
+        return near
+        
+    def _heuristic(self, xy: np.ndarray, goal: np.ndarray) -> np.ndarray:
+        """Calculate heuristic costs from nodes to a goal.
+        
+        Args:
+            xy: (N, 2) array of node coordinates
+            goal: Goal coordinates
+            
+        Returns:
+            (N,) array of estimated costs to the goal
+        """
+        # Base cost is Euclidean distance
+        base_cost = np.hypot(xy[:, 0] - goal[0], xy[:, 1] - goal[1])
+        if not self._obstacles:
+            return base_cost
+            
+        # Add clearance penalty
+        segments = np.stack([xy, np.broadcast_to(goal, xy.shape)], axis=1)
+        return np.where(self._near_obstacles(segments),
+                        base_cost * self.config.clearance_penalty, base_cost)
     
-    def _count_bends(self, path: List[Point]) -> int:
+    def _count_bends(self, path: np.ndarray) -> int:
         """Count the number of bends in a path.
         
         Args:
-            path: List of points forming the path
+            path: (N, 2) array of path coordinates
             
         Returns:
             Number of bends
         """
-        if len(path) < 3:
-            return 0
-            
-        bends = 0
-        for i in range(1, len(path) - 1):
-            v1 = np.array([path[i].x - path[i-1].x, path[i].y - path[i-1].y])
-            v2 = np.array([path[i+1].x - path[i].x, path[i+1].y - path[i].y])
-            angle = np.arccos(np.dot(v1, v2) / 
-                            (np.linalg.norm(v1) * np.linalg.norm(v2)))
-            if angle < np.pi * 0.75:  # Less than 135 degrees
-                bends += 1
-                
-        return bends
+        return _count_bends_kernel(path)
     
-    def _smooth_path(self, path: List[Point]) -> List[Point]:
+    def _smooth_path(self, path: np.ndarray) -> np.ndarray:
         """Smooth a path using moving average.
         
         Args:
-            path: List of points forming the path
+            path: (N, 2) array of path coordinates
             
         Returns:
-            Smoothed path
+            Smoothed (N, 2) array; start and end points are kept
         """
         if len(path) < 3:
             return path
-            
-        smoothed = [path[0]]  # Keep start point
-        for i in range(1, len(path) - 1):
-            prev = path[i-1]
-            curr = path[i]
-            next_pt = path[i+1]
-            
-            # Calculate smoothed point
-            smooth_x = (prev.x + curr.x + next_pt.x) / 3
-            smooth_y = (prev.y + curr.y + next_pt.y) / 3
-            
-            # Interpolate between original and smoothed point
-            new_x = curr.x + (smooth_x - curr.x) * self.config.smoothing_factor
-            new_y = curr.y + (smooth_y - curr.y) * self.config.smoothing_factor
-            
-            smoothed.append(Point(new_x, new_y))
-            
-        smoothed.append(path[-1])  # Keep end point
-        return smoothed
+        return _smooth_path_kernel(path, self.config.smoothing_factor)
     
-    def _enforce_constraints(self, path: List[Point], 
-                           obstacles: List[Polygon]) -> List[Point]:
+    def _split_segments(self, path: np.ndarray) -> np.ndarray:
+        """Split segments longer than max_segment_length into equal pieces.
+        
+        Args:
+            path: (N, 2) array of path coordinates
+        
+        Returns:
+            (M, 2) array with intermediate points added
+        """
+        diffs = np.diff(path, axis=0)
+        lengths = np.hypot(diffs[:, 0], diffs[:, 1])
+        max_length = self.config.max_segment_length
+        num_pieces = np.where(lengths > max_length,
+                              (lengths / max_length).astype(np.int64) + 1, 1)
+        
+        # Start point of every piece, as a fraction along its segment
+        segment_idx = np.repeat(np.arange(len(diffs)), num_pieces)
+        piece_idx = np.arange(len(segment_idx)) - np.repeat(
+            np.cumsum(num_pieces) - num_pieces, num_pieces)
+        t = piece_idx / num_pieces[segment_idx]
+        return np.vstack([path[segment_idx] + t[:, None] * diffs[segment_idx],
+                          path[-1:]])
+    
+    def _enforce_constraints(self, path: np.ndarray) -> np.ndarray:
         """Enforce MEP routing constraints on a path.
         
+        Clearance is checked against the obstacles the router is bound to.
+        
         Args:
-            path: List of points forming the path
-            obstacles: List of obstacle polygons
-            
+            path: (N, 2) array of path coordinates
+        
         Returns:
-            Modified path satisfying constraints
+            Modified (M, 2) array satisfying constraints
         """
         if len(path) < 3:
             return path
-            
+        
         # Split long segments
-        new_path = [path[0]]
-        for i in range(len(path) - 1):
-            segment = LineString([path[i], path[i+1]])
-            if segment.length > self.config.max_segment_length:
-                # Add intermediate points
-                num_points = int(segment.length / self.config.max_segment_length) + 1
-                for j in range(1, num_points):
-                    t = j / num_points
-                    new_point = Point(
-                        path[i].x + t * (path[i+1].x - path[i].x),
-                        path[i].y + t * (path[i+1].y - path[i].y)
-                    )
-                    new_path.append(new_point)
-            new_path.append(path[i+1])
-            
+        new_path = self._split_segments(path)
+        
         # Smooth path while maintaining clearance
         smoothed = self._smooth_path(new_path)
         
-        # Verify clearance after smoothing
-        for i in range(len(smoothed) - 1):
-            segment = LineString([smoothed[i], smoothed[i+1]])
-            if any(segment.distance(obs) < self.config.min_bend_radius 
-                  for obs in obstacles):
-                # Revert to original point if clearance is violated
-                smoothed[i] = new_path[i]
-                
+        # Verify clearance after smoothing; reverting a point never changes
+        # a later segment, so all segments are checked at once
+        segments = np.stack([smoothed[:-1], smoothed[1:]], axis=1)
+        violated = np.flatnonzero(self._near_obstacles(segments))
+        
+        # Revert to original points where clearance is violated
+        smoothed[violated] = new_path[violated]
         return smoothed
     
-    def find_path(self, G: nx.Graph, start: Point, end: Point,
+    def find_path(self, G: RoutingGraph, start: Point, end: Point,
                  obstacles: List[Polygon]) -> Optional[List[Point]]:
         """Find an optimal path between two points using modified A*.
         
         Args:
-            G: NetworkX graph for routing
+            G: Routing graph
             start: Start point
             end: End point
             obstacles: List of obstacle polygons
@@ -166,53 +358,129 @@ class MEPRouter:
         Returns:
             List of points forming the path, or None if no path exists
         """
+        if G.num_nodes == 0:
+            return None
+        self._prepare(G, obstacles)
+            
         # Find nearest graph nodes to start and end points
-        start_node = min(G.nodes(), key=lambda n: n.distance(start))
-        end_node = min(G.nodes(), key=lambda n: n.distance(end))
+        ends = np.array([(start.x, start.y), (end.x, end.y)])
+        _, nearest = G.kdtree.query(ends)
+        start_node, end_node = nearest.tolist()
+        return self._route(G, ends[0], ends[1], start_node, end_node)
+    
+    def _node_path(self, G: RoutingGraph, start_node: int,
+                   end_node: int) -> Optional[List[int]]:
+        """Find the node path between two graph nodes using A*.
         
-        # Define heuristic function for A*
-        def heuristic(n1: Point, n2: Point) -> float:
-            return self._heuristic(n1, n2, obstacles)
+        Args:
+            G: Routing graph the router is bound to
+            start_node: Start node
+            end_node: Goal node
+            
+        Returns:
+            List of node indices, or None if no path exists
+        """
+        # Reuse the node path if this search was already run on this graph
+        key = (start_node, end_node)
+        if key not in self._path_cache:
+            # Heuristic values only depend on the goal node, so they are
+            # shared by all searches towards it
+            heuristic = self._heuristic_cache.get(end_node)
+            if heuristic is None:
+                heuristic = self._heuristic(G.xy, G.xy[end_node])
+                self._heuristic_cache[end_node] = heuristic
+            path = _astar_csr(G.indptr, G.indices, G.weights, heuristic,
+                              start_node, end_node)
+            self._path_cache[key] = path.tolist() if len(path) else None
+        return self._path_cache[key]
+    
+    def _route_chain(self, path: np.ndarray) -> Optional[List[Point]]:
+        """Check and post-process the point chain of a route.
         
-        try:
-            # Find path using A*
-            path = nx.astar_path(G, start_node, end_node, 
-                                heuristic=heuristic, weight='weight')
+        Args:
+            path: (N, 2) array of path coordinates
             
-            # Add actual start and end points
-            full_path = [start] + path + [end]
+        Returns:
+            List of points forming the path, or None if it has too many bends
+        """
+        # Count bends and check constraints
+        if self._count_bends(path) > self.config.max_bends:
+            return None
             
-            # Count bends and check constraints
-            if self._count_bends(full_path) > self.config.max_bends:
-                return None
-                
-            # Enforce MEP constraints
-            constrained_path = self._enforce_constraints(full_path, obstacles)
+        # Enforce MEP constraints
+        return shapely.points(self._enforce_constraints(path)).tolist()
+    
+    def _route(self, G: RoutingGraph, start: np.ndarray, end: np.ndarray,
+               start_node: int, end_node: int) -> Optional[List[Point]]:
+        """Find a path between two points snapped to graph nodes.
+        
+        Args:
+            G: Routing graph the router is bound to
+            start: Start coordinates
+            end: End coordinates
+            start_node: Graph node nearest to start
+            end_node: Graph node nearest to end
             
-            return constrained_path
+        Returns:
+            List of points forming the path, or None if no path exists
+        """
+        # Reuse the finished path if these endpoints were already routed
+        result_key = (*start.tolist(), *end.tolist())
+        if result_key not in self._result_cache:
+            result = None
+            straight = np.vstack([start, end])
+            blocked = (self._crosses_obstacles(straight[None]) |
+                       self._near_obstacles(straight[None]))
+            if not blocked[0]:
+                # Clear line of sight needs no search; long runs are only split
+                result = shapely.points(self._split_segments(straight)).tolist()
+            else:
+                path = self._node_path(G, start_node, end_node)
+                if path is not None:
+                    # Add actual start and end points
+                    result = self._route_chain(np.vstack([start, G.xy[path], end]))
+            self._result_cache[result_key] = result
             
-        except nx.NetworkXNoPath:
-            return None
+        result = self._result_cache[result_key]
+        return list(result) if result is not None else None
     
-    def find_multiple_paths(self, G: nx.Graph, 
+    def find_multiple_paths(self, G: RoutingGraph,
                            endpoints: List[Tuple[Point, Point]],
                            obstacles: List[Polygon]) -> List[List[Point]]:
         """Find multiple paths between endpoint pairs.
         
         Args:
-            G: NetworkX graph for routing
+            G: Routing graph
             endpoints: List of (start, end) point pairs
             obstacles: List of obstacle polygons
             
         Returns:
             List of paths, where each path is a list of points
         """
-        paths = []
-        for start, end in endpoints:
-            path = self.find_path(G, start, end, obstacles)
-            if path is not None:
-                paths.append(path)
-        return paths
+        # The worker count comes from request configs, so it is capped
+        # by the available CPUs
+        num_workers = min(self.config.num_workers, os.cpu_count() or 1, len(endpoints))
+        if G.num_nodes == 0 or not endpoints:
+            return []
+        elif num_workers < 2:
+            self._prepare(G, obstacles)
+            
+            # Find nearest graph nodes to all endpoints in one query
+            ends = shapely.get_coordinates([point for pair in endpoints for point in pair])
+            _, nearest = G.kdtree.query(ends)
+            ends, nearest = ends.reshape(-1, 2, 2), nearest.reshape(-1, 2).tolist()
+            results = [self._route(G, start, end, start_node, end_node)
+                       for (start, end), (start_node, end_node) in zip(ends, nearest)]
+        else:
+            # Each worker receives the graph and obstacles once
+            with ProcessPoolExecutor(max_workers=num_workers,
+                                     initializer=_init_route_worker,
+                                     initargs=(self.config, G, obstacles)) as pool:
+                futures = [pool.submit(_route_in_worker, start, end)
+                           for start, end in endpoints]
+                results = [future.result() for future in futures]
+                
+        return [path for path in results if path is not None]
     
     def optimize_paths(self, paths: List[List[Point]], 
                       obstacles: List[Polygon]) -> List[List[Point]]:
@@ -234,25 +502,20 @@ class MEPRouter:
             path_line = LineString(path)
             path_buffers.append(path_line.buffer(self.config.min_bend_radius))
             
-        # Add path buffers to obstacles for subsequent paths
-        current_obstacles = obstacles.copy()
         optimized_paths = []
         
         for i, path in enumerate(paths):
             # Add buffers of previous paths to obstacles
-            if i > 0:
-                current_obstacles.extend(path_buffers[:i])
+            current_obstacles = obstacles + path_buffers[:i]
                 
             # Re-route path with updated obstacles
             if len(path) >= 2:
-                G = nx.Graph()  # Create new graph for this path
-                # Add nodes and edges (simplified for example)
-                for point in path:
-                    G.add_node(point, pos=(point.x, point.y))
-                for j in range(len(path) - 1):
-                    G.add_edge(path[j], path[j+1])
-                    
-                new_path = self.find_path(G, path[0], path[-1], current_obstacles)
+                # The graph of a single path is the chain of its points, so
+                # the only route is the chain itself; it is post-processed
+                # like a found path, with the endpoints added again
+                self._prepare(self._graph, current_obstacles)
+                xy = shapely.get_coordinates(path)
+                new_path = self._route_chain(np.vstack([xy[:1], xy, xy[-1:]]))
                 if new_path is not None:
                     optimized_paths.append(new_path)
                     # Update path buffer
@@ -263,4 +526,32 @@ class MEPRouter:
             else:
                 optimized_paths.append(path)
                 
-        return optimized_paths 
\ No newline at end of file
+        return optimized_paths
+
+# Router, graph and obstacles of a find_multiple_paths worker process
+_worker_state: Optional[Tuple[MEPRouter, RoutingGraph, List[Polygon]]] = None
+
+def _init_route_worker(config: RouterConfig, G: RoutingGraph,
+                       obstacles: List[Polygon]) -> None:
+    """Store the routing inputs shared by all tasks of a worker process.
+    
+    Args:
+        config: Router configuration
+        G: Routing graph
+        obstacles: List of obstacle polygons
+    """
+    global _worker_state
+    _worker_state = (MEPRouter(config), G, obstacles)
+
+def _route_in_worker(start: Point, end: Point) -> Optional[List[Point]]:
+    """Find one path in a worker process.
+    
+    Args:
+        start: Start point
+        end: End point
+        
+    Returns:
+        List of points forming the path, or None if no path exists
+    """
+    router, G, obstacles = _worker_state
+    return router.find_path(G, start, end, obstacles)
@@ -9,6 +9,7 @@ from typing import List, Optional, Tuple
 
 import cv2
 import numpy as np
+import shapely
 from shapely.geometry import LineString, Point, Polygon
 from shapely.ops import unary_union
 
@@ -18,7 +19,6 @@ class SpaceModelConfig:
     raster_resolution: float = 100.0  # pixels per unit
     clearance_distance: float = 0.5   # minimum clearance from obstacles
     min_room_size: float = 2.0        # minimum room size to consider
-    threshold_value: int = 127        # binary threshold value (0-255)
 
 class SpaceModeler:
     """Handles space modeling for MEP routing."""
@@ -40,11 +40,7 @@ class SpaceModeler:
         Returns:
             Tuple of (minx, miny, maxx, maxy)
         """
-        bounds = [geom.bounds for geom in geometries]
-        minx = min(b[0] for b in bounds)
-        miny = min(b[1] for b in bounds)
-        maxx = max(b[2] for b in bounds)
-        maxy = max(b[3] for b in bounds)
+        minx, miny, maxx, maxy = shapely.total_bounds(geometries).tolist()
         return minx, miny, maxx, maxy
         
     def rasterize_geometries(self, 
@@ -66,42 +62,43 @@ class SpaceModeler:
         width = int((maxx - minx) * self.config.raster_resolution)
         height = int((maxy - miny) * self.config.raster_resolution)
         
-        # Create blank image
-        image = np.zeros((height, width), dtype=np.uint8)
+        # Create blank image; obstacles are drawn as 1
+        binary = np.zeros((height, width), dtype=np.uint8)
         
         # Helper function to convert world coordinates to image coordinates
-        def world_to_image(x: float, y: float) -> Tuple[int, int]:
-            img_x = int((x - minx) * self.config.raster_resolution)
-            img_y = int((maxy - y) * self.config.raster_resolution)  # Flip Y axis
-            return img_x, img_y
-        
-        # Draw walls
+        def world_to_image(coords: np.ndarray) -> np.ndarray:
+            points = np.empty(coords.shape, dtype=np.int32)
+            points[:, 0] = (coords[:, 0] - minx) * self.config.raster_resolution
+            points[:, 1] = (maxy - coords[:, 1]) * self.config.raster_resolution  # Flip Y axis
+            return points
+        
+        # Helper function to convert geometries to one image contour each
+        def to_contours(geoms: np.ndarray) -> List[np.ndarray]:
+            coords, index = shapely.get_coordinates(geoms, return_index=True)
+            return np.split(world_to_image(coords), np.flatnonzero(np.diff(index)) + 1)
+        
+        # Draw walls; filling all rings in one call leaves the holes
+        # (interiors) empty
         if isinstance(wall_geometry, Polygon):
-            exterior = wall_geometry.exterior
-            points = [world_to_image(x, y) for x, y in exterior.coords]
-            cv2.fillPoly(image, [np.array(points)], 255)
-            
-            # Fill holes (interiors)
-            for interior in wall_geometry.interiors:
-                points = [world_to_image(x, y) for x, y in interior.coords]
-                cv2.fillPoly(image, [np.array(points)], 0)
-        
-        # Draw equipment
-        for geom in equipment_geometries:
-            if isinstance(geom, Polygon):
-                points = [world_to_image(x, y) for x, y in geom.exterior.coords]
-                cv2.fillPoly(image, [np.array(points)], 255)
-            elif isinstance(geom, LineString):
-                points = [world_to_image(x, y) for x, y in geom.coords]
-                cv2.polylines(image, [np.array(points)], False, 255, 2)
-        
-        # Apply threshold to get binary image
-        _, binary = cv2.threshold(image, self.config.threshold_value, 1, cv2.THRESH_BINARY)
-        
-        # Apply clearance distance using morphological operations
+            cv2.fillPoly(binary, to_contours(shapely.get_rings(wall_geometry)), 1)
+        
+        # Draw equipment; all coordinates are converted at once, but polygons
+        # are filled one by one since overlapping contours cancel out when
+        # filled in a single call
+        polygons = [geom for geom in equipment_geometries if isinstance(geom, Polygon)]
+        lines = [geom for geom in equipment_geometries if isinstance(geom, LineString)]
+        if polygons:
+            for contour in to_contours(shapely.get_exterior_ring(polygons)):
+                cv2.fillPoly(binary, [contour], 1)
+        if lines:
+            cv2.polylines(binary, to_contours(lines), False, 1, 2)
+        
+        # Apply clearance distance using morphological operations; OpenCV
+        # dilates with rectangular kernels as separate row and column passes
         kernel_size = int(self.config.clearance_distance * self.config.raster_resolution)
-        kernel = np.ones((kernel_size, kernel_size), np.uint8)
-        binary = cv2.dilate(binary, kernel, iterations=1)
+        if kernel_size > 1:
+            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_size, kernel_size))
+            binary = cv2.dilate(binary, kernel, iterations=1)
         
         return binary
     
@@ -120,9 +117,9 @@ class SpaceModeler:
             List of free space polygons
         """
         # Create buffer around walls and equipment for clearance
-        obstacles = [wall_geometry]
-        obstacles.extend(geom.buffer(self.config.clearance_distance) 
-                        for geom in equipment_geometries)
+        buffered = shapely.buffer(np.asarray(equipment_geometries, dtype=object),
+                                  self.config.clearance_distance, quad_segs=16)
+        obstacles = [wall_geometry, *buffered]
         
         # Union all obstacles
         obstacle_union = unary_union(obstacles)
@@ -163,15 +160,19 @@ class SpaceModeler:
         Returns:
             List of connection points (typically near doors)
         """
-        connection_points = []
-        
-        for door in door_geometries:
-            if isinstance(door, LineString):
-                # Use midpoint of door as connection point
-                midpoint = door.interpolate(0.5, normalized=True)
-                connection_points.append(midpoint)
-            elif isinstance(door, Polygon):
-                # Use centroid of door polygon
-                connection_points.append(door.centroid)
-                
-        return connection_points 
\ No newline at end of file
+        doors = np.asarray(door_geometries, dtype=object)
+        type_ids = shapely.get_type_id(doors)
+        is_line = np.isin(type_ids, [shapely.GeometryType.LINESTRING,
+                                     shapely.GeometryType.LINEARRING])
+        is_polygon = type_ids == shapely.GeometryType.POLYGON
+        
+        connection_points = np.empty(len(doors), dtype=object)
+        
+        # Use midpoint of door lines as connection point
+        connection_points[is_line] = shapely.line_interpolate_point(
+            doors[is_line], 0.5, normalized=True)
+        
+        # Use centroid of door polygons
+        connection_points[is_polygon] = shapely.centroid(doors[is_polygon])
+        
+        return connection_points[is_line | is_polygon].tolist() 
\ No newline at end of file
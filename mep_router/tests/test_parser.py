@@ -0,0 +1,66 @@
+"""Tests for DXF reading and the geometry cache."""
+
+import ezdxf
+import numpy as np
+import pytest
+
+from mep_router.core.parser import DXFReader
+
+
+@pytest.fixture
+def dxf_path(tmp_path):
+    """Write a small drawing with a wall outline and a door line."""
+    doc = ezdxf.new('R2010')
+    msp = doc.modelspace()
+    msp.add_lwpolyline([(0, 0), (10, 0), (10, 8), (0, 8)], close=True,
+                       dxfattribs={'layer': 'WALLS'})
+    msp.add_line((4, 0), (5, 0), dxfattribs={'layer': 'DOORS'})
+    msp.add_line((1, 1), (2, 2), dxfattribs={'layer': '0'})
+    path = tmp_path / "plan.dxf"
+    doc.saveas(path)
+    return path
+
+
+def _wkt(geometries):
+    return {layer: [geometry.wkt for geometry in layer_geometries]
+            for layer, layer_geometries in geometries.items()}
+
+
+def test_read_file_reuses_cached_geometries(dxf_path, tmp_path):
+    reader = DXFReader()
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    
+    doc, parsed = reader.read_file(dxf_path, cache_dir=cache_dir)
+    assert doc is not None
+    assert set(parsed) == {"WALLS", "DOORS"}
+    
+    # A copy of the drawing hits the cache written for the original
+    copy_path = tmp_path / "copy.dxf"
+    copy_path.write_bytes(dxf_path.read_bytes())
+    doc, cached = reader.read_file(copy_path, cache_dir=cache_dir)
+    assert doc is None
+    assert _wkt(cached) == _wkt(parsed)
+
+
+def test_read_file_ignores_pickled_cache(dxf_path, tmp_path):
+    reader = DXFReader()
+    cache_path = reader._cache_path(dxf_path, tmp_path)
+    with cache_path.open("wb") as f:
+        np.savez(f, layers=np.array(["WALLS"]), counts=np.array([1]),
+                 sizes=np.array([1]), wkb=np.array([object()], dtype=object))
+    
+    doc, geometries = reader.read_file(dxf_path, cache_dir=tmp_path)
+    assert doc is not None
+    assert set(geometries) == {"WALLS", "DOORS"}
+    
+    # The rewritten cache file is read back without the parse
+    doc, _ = reader.read_file(dxf_path, cache_dir=tmp_path)
+    assert doc is None
+
+
+def test_read_file_without_cache_dir_writes_nothing(dxf_path, tmp_path):
+    doc, _ = DXFReader().read_file(dxf_path)
+    
+    assert doc is not None
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["plan.dxf"]
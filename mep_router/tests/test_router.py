@@ -0,0 +1,94 @@
+"""Tests for the CSR A* search and straight runs of the router."""
+
+import networkx as nx
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import LineString, Point, box
+
+from mep_router.core.graph import RoutingGraph
+from mep_router.core.router import MEPRouter, RouterConfig, _astar_csr
+
+# Wall between the endpoints of the line-of-sight tests
+WALL = box(4, -5, 5, 5)
+
+
+def _random_graph(rng: np.random.Generator, num_nodes: int,
+                  num_edges: int) -> RoutingGraph:
+    """Build a random routing graph without self-loops or duplicate edges."""
+    xy = rng.uniform(0, 10, (num_nodes, 2))
+    pairs = rng.integers(0, num_nodes, (num_edges, 2))
+    pairs = np.unique(np.sort(pairs[pairs[:, 0] != pairs[:, 1]], axis=1), axis=0)
+    weights = rng.uniform(0.1, 5.0, len(pairs))
+    return RoutingGraph.from_edges(xy, pairs, weights)
+
+
+def _grid_around(obstacle) -> RoutingGraph:
+    """Build a unit grid graph whose nodes and edges avoid an obstacle."""
+    gx, gy = np.meshgrid(np.arange(0, 10), np.arange(-7, 8))
+    xy = np.column_stack([gx.ravel(), gy.ravel()]).astype(np.float64)
+    index = {tuple(p): i for i, p in enumerate(xy.tolist())}
+    pairs = np.array([(i, index[(x + dx, y + dy)])
+                      for (x, y), i in index.items()
+                      for dx, dy in ((1, 0), (0, 1))
+                      if (x + dx, y + dy) in index])
+    lines = shapely.linestrings(xy[pairs])
+    pairs = pairs[~shapely.intersects(lines, obstacle)]
+    return RoutingGraph.from_edges(xy, pairs, np.ones(len(pairs)))
+
+
+def _astar(G: RoutingGraph, heuristic: np.ndarray, source: int, target: int) -> list:
+    """Run the CSR A* search on a routing graph."""
+    path = _astar_csr(G.indptr, G.indices, G.weights, heuristic, source, target)
+    return path.tolist()
+
+
+@pytest.mark.parametrize("seed", range(150))
+def test_astar_matches_networkx(seed):
+    rng = np.random.default_rng(seed)
+    num_nodes = int(rng.integers(2, 40))
+    G = _random_graph(rng, num_nodes, int(rng.integers(1, 3 * num_nodes)))
+    heuristic = rng.uniform(0, 5.0, num_nodes)
+    source, target = (int(i) for i in rng.integers(0, num_nodes, 2))
+    
+    try:
+        expected = nx.astar_path(G.to_networkx(), source, target,
+                                 heuristic=lambda u, v: heuristic[u],
+                                 weight='weight')
+    except nx.NetworkXNoPath:
+        expected = []
+    assert _astar(G, heuristic, source, target) == expected
+
+
+def test_astar_no_path():
+    xy = np.array([[0.0, 0.0], [1.0, 0.0], [5.0, 0.0], [6.0, 0.0]])
+    G = RoutingGraph.from_edges(xy, np.array([[0, 1], [2, 3]]), np.ones(2))
+    
+    assert _astar(G, np.zeros(4), 0, 3) == []
+
+
+def test_astar_source_is_target():
+    rng = np.random.default_rng(0)
+    G = _random_graph(rng, 10, 20)
+    
+    assert _astar(G, np.zeros(10), 4, 4) == [4]
+
+
+@pytest.mark.parametrize("min_bend_radius", [0.0, 0.5])
+def test_straight_run_does_not_cross_obstacles(min_bend_radius):
+    router = MEPRouter(RouterConfig(min_bend_radius=min_bend_radius, max_bends=100))
+    
+    path = router.find_path(_grid_around(WALL), Point(1, 0), Point(8, 0), [WALL])
+    
+    assert path is not None
+    assert len(path) > 2
+    assert not LineString(path).intersects(WALL)
+
+
+@pytest.mark.parametrize("min_bend_radius", [0.0, 0.5])
+def test_clear_line_of_sight_is_straight(min_bend_radius):
+    router = MEPRouter(RouterConfig(min_bend_radius=min_bend_radius))
+    
+    path = router.find_path(_grid_around(WALL), Point(1, 6), Point(8, 6), [WALL])
+    
+    assert [(p.x, p.y) for p in path] == [(1, 6), (8, 6)]